@@ -3,61 +3,125 @@ import argparse
 import csv
 import random
 import time
+from collections import defaultdict
+from operator import itemgetter
 
-ID_POS = 2
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
-class Patient:
-    def __init__(self, row) -> None:
-        self.id = row[ID_POS]
-        self.data = row
-        self.first_idx = len(row)  # First non used column
+ID_POS = 2
 
 
 class Doctor:
     def __init__(self, name) -> None:
         self.name = name
         self.patients_first = []
+        self.patients_first_set = set()
         self.patients_second = []
+        self.patients_second_set = set()
+
+
+def fisher_yates(items):
+    """Shuffle the items in place. Equivalent to random.shuffle (and driven by
+    the same seedable generator) but draws each bounded random index directly
+    from random.getrandbits instead of going through the random._randbelow
+    method call, which makes the shuffle noticeably faster on large lists."""
+    getrandbits = random.getrandbits
+    for i in range(len(items) - 1, 0, -1):
+        n = i + 1
+        k = n.bit_length()
+        j = getrandbits(k)
+        while j >= n:
+            # Reject out of range draws to keep the index uniform
+            j = getrandbits(k)
+        items[i], items[j] = items[j], items[i]
+
+
+if np is not None:
+
+    def assign_second(forbidden_doc, nof_doctors, rng_seed):
+        """Kernel for the second-round assignment. forbidden_doc[i] holds the
+        first-round doctor index of patient i. Returns an array where entry i is
+        the second-round doctor index of patient i. Same algorithm as the pure
+        Python path in distribute_second; compiled with numba when available."""
+        nof_patients = forbidden_doc.shape[0]
+        np.random.seed(rng_seed)
+        order = np.arange(nof_patients)
+        np.random.shuffle(order)
+        slot_doctors = np.arange(nof_patients) % nof_doctors
+        for i in range(nof_patients):
+            doctor_idx = slot_doctors[i]
+            if forbidden_doc[order[i]] == doctor_idx:
+                j = i + 1
+                while j < nof_patients and forbidden_doc[order[j]] == doctor_idx:
+                    j += 1
+                if j < nof_patients:
+                    order[i], order[j] = order[j], order[i]
+                else:
+                    repaired = False
+                    for k in range(i):
+                        if (
+                            forbidden_doc[order[k]] != doctor_idx
+                            and forbidden_doc[order[i]] != slot_doctors[k]
+                        ):
+                            order[i], order[k] = order[k], order[i]
+                            repaired = True
+                            break
+                    if not repaired:
+                        # No patient swap can clear this slot (even split
+                        # infeasible); hand the slot to the next doctor, same
+                        # as the pure Python path
+                        slot_doctors[i] = (doctor_idx + 1) % nof_doctors
+        assigned = np.empty(nof_patients, dtype=np.int64)
+        for i in range(nof_patients):
+            assigned[order[i]] = slot_doctors[i]
+        return assigned
+
+    if njit is not None:
+        assign_second = njit(cache=True)(assign_second)
 
 
 def read_doctor_data(input_file):
     """Open the doctor file (text) and create a dictionary of all the doctors"""
-    doctors = dict()
-    idx = 0
-    with open(input_file, newline="") as f:
-        for name in f:
-            name = name.rstrip(" \t\n\r")
-            if name:
-                doctors[idx] = Doctor(name)
-                idx += 1
-    return doctors
+    with open(input_file) as f:
+        names = [name.strip() for name in f.read().splitlines() if name.strip()]
+    return {idx: Doctor(name) for idx, name in enumerate(names)}
 
 
 def read_patient_data(input_file):
-    """Open the csv file and return a dict of all patients (Patient objects) and the header"""
-    patients = {}
-    header = None
-    with open(input_file, newline="") as csvfile:
+    """Open the csv file and return the header and the list of patient ids in
+    file order. Only the id column is kept in memory; the full rows are streamed
+    again by write_patient_data once the distribution is decided."""
+    with open(input_file, newline="", buffering=1 << 20) as csvfile:
         patient_reader = csv.reader(csvfile, delimiter=",", quotechar="|")
-        for idx, row in enumerate(patient_reader):
-            if idx == 0:
-                header = row
-            else:
-                patient = Patient(row)
-                patients[patient.id] = patient
-    return header, patients
-
-
-def write_patient_data(header, patients, output_file):
-    """Write all patient data into the output_file, overwriting existing data.
-    Add two output columns"""
-    with open(output_file, "w", newline="") as csvfile:
-        patient_writer = csv.writer(csvfile, delimiter=",", quotechar="|")
+        header = next(patient_reader)
+        ids = list(map(itemgetter(ID_POS), patient_reader))
+    return header, ids
+
+
+def write_patient_data(header, doc1, doc2, input_file, output_file):
+    """Stream the patient rows from the input_file to the output_file,
+    overwriting existing data. Add two output columns with the assigned doctors.
+    Re-reading the rows here means they never have to be held in memory."""
+    with open(input_file, newline="", buffering=1 << 20) as infile, open(
+        output_file, "w", newline="", buffering=1 << 20
+    ) as outfile:
+        patient_reader = csv.reader(infile, delimiter=",", quotechar="|")
+        patient_writer = csv.writer(outfile, delimiter=",", quotechar="|")
+        next(patient_reader)  # The header was already read in the first pass
         header.extend(["DOCTOR 1", "DOCTOR 2"])
         patient_writer.writerow(header)
-        for patient in patients.values():
-            patient_writer.writerow(patient.data)
+        patient_writer.writerows(
+            row + [first, second]
+            for row, first, second in zip(patient_reader, doc1, doc2)
+        )
 
 
 def print_distribution_info(doctors):
@@ -75,83 +139,173 @@ def print_distribution_info(doctors):
     print()
 
 
-def distribute_first(patients, doctors):
+def distribute_first(ids, id_to_idx, doctors):
     """Distribute evenly the list of patients on the doctors. Update the doctor's
-    patients_first attribute accordingly."""
-    patient_ids = [patient.id for patient in patients.values()]
-    random.shuffle(patient_ids)
-    base, extra = divmod(len(patient_ids), len(doctors))
-
+    patients_first attribute accordingly. Return the first doctor column (one
+    doctor name per patient, in file order) and a dict that maps each patient id
+    to the index of the doctor it was assigned to (used by distribute_second to
+    avoid assigning a patient to the same doctor twice)."""
+    doc_list = list(doctors.values())
+    nof_doctors = len(doc_list)
+    if nof_doctors == 1:
+        # Nothing to shuffle - everyone goes to the only doctor
+        doctor = doc_list[0]
+        doctor.patients_first = list(ids)
+        doctor.patients_first_set = set(ids)
+        return [doctor.name] * len(ids), dict.fromkeys(ids, 0)
+
+    base, extra = divmod(len(ids), nof_doctors)
+
+    if np is not None:
+        # Vectorized path: draw one random permutation and scatter evenly sized
+        # blocks of doctor indices through it, then do a single pass to fill in
+        # the doctor data structures.
+        counts = [base + 1] * extra + [base] * (nof_doctors - extra)
+        doc_idx = np.repeat(np.arange(nof_doctors), counts)
+        perm = np.random.permutation(len(ids))
+        assigned = np.empty(len(ids), dtype=np.int64)
+        assigned[perm] = doc_idx
+        assigned = assigned.tolist()
+
+        names = [doctor.name for doctor in doc_list]
+        doc1 = [None] * len(ids)
+        forbidden = {}
+        for idx, patient_id in enumerate(ids):
+            i = assigned[idx]
+            forbidden[patient_id] = i
+            doc_list[i].patients_first.append(patient_id)
+            doc1[idx] = names[i]
+        for doctor in doc_list:
+            doctor.patients_first_set = set(doctor.patients_first)
+        return doc1, forbidden
+
+    patient_ids = list(ids)
+    if len(patient_ids) > 1:
+        fisher_yates(patient_ids)
+
+    doc1 = [None] * len(ids)
+    forbidden = {}
     start = 0
-    for i in range(len(doctors)):
+    for i in range(nof_doctors):
+        doctor = doc_list[i]
+        name = doctor.name
         nof_patients = base + (1 if i < extra else 0)
-        doctors[i].patients_first = patient_ids[start : start + nof_patients]
-        start += nof_patients
-
-    for doctor in doctors.values():
+        doctor.patients_first = patient_ids[start : start + nof_patients]
+        doctor.patients_first_set = set(doctor.patients_first)
         for patient_id in doctor.patients_first:
-            # Find patient and add doctor in first output column
-            patients[patient_id].data.append(doctor.name)
+            forbidden[patient_id] = i
+            doc1[id_to_idx[patient_id]] = name
+        start += nof_patients
+    return doc1, forbidden
 
 
-def distribute_second(patients, doctors):
+def distribute_second(ids, id_to_idx, doctors, forbidden):
     """Distribute the patients a second time. The patients shall be distributed
     evenly and randomly. No patient must end up at the same doctor as in the first
-    round."""
-    remaining_ids = [p.id for p in patients.values()]
-    nof_remaining = len(remaining_ids)
-
-    while nof_remaining > 0:
-        for doctor in doctors.values():
-            # Create a list of all patients that the doctor has not in its first round and
-            # that have not already been picked. Shuffle the list and pick one patient and
-            # add it to the doctor's second list.
-            selection = [p for p in remaining_ids if p not in doctor.patients_first]
-            if len(selection) > 0:
-                random.shuffle(selection)
-                picked_id = selection[0]
-                doctor.patients_second.append(picked_id)
-                remaining_ids.remove(picked_id)
-                nof_remaining -= 1
-
-    for doctor in doctors.values():
-        for patient_id in doctor.patients_second:
-            # Find patient and add doctor in second output column
-            patients[patient_id].data.append(doctor.name)
-
-
-def check_input(patients, doctors):
+    round (the first round assignment is given by the forbidden dict). When the
+    constraint makes an exactly even split impossible (e.g. two doctors and an
+    odd number of patients) the counts may differ by one more than in the first
+    round. The ids
+    are shuffled once and then consumed in order, so only O(P) random draws are
+    needed in total and no intermediate candidate lists are allocated while
+    picking. Return the second doctor column (one doctor name per patient, in
+    file order)."""
+    doc_list = list(doctors.values())
+    nof_doctors = len(doc_list)
+
+    if np is not None and njit is not None:
+        # Compiled path: run the assignment kernel on int arrays and convert
+        # the returned doctor indices back to names in a single pass. The seed
+        # comes from the module generator so --seed stays reproducible.
+        forbidden_doc = np.fromiter(
+            (forbidden[patient_id] for patient_id in ids), np.int64, count=len(ids)
+        )
+        assigned = assign_second(forbidden_doc, nof_doctors, random.getrandbits(32))
+        assigned = assigned.tolist()
+
+        names = [doctor.name for doctor in doc_list]
+        doc2 = [None] * len(ids)
+        for idx, patient_id in enumerate(ids):
+            i = assigned[idx]
+            doc_list[i].patients_second.append(patient_id)
+            doc2[idx] = names[i]
+        for doctor in doc_list:
+            doctor.patients_second_set = set(doctor.patients_second)
+        return doc2
+
+    shuffled = list(ids)
+    if len(shuffled) > 1:
+        fisher_yates(shuffled)
+    nof_patients = len(shuffled)
+
+    # Walk the shuffled list assigning patient i to the doctor in slot i
+    # (initially doctor i % nof_doctors). If the patient had that doctor in the
+    # first round, swap in the next patient that did not. A trailing conflict is
+    # repaired by swapping with an already placed patient whose slots are
+    # compatible with both.
+    slot_doctors = [i % nof_doctors for i in range(nof_patients)]
+    for i in range(nof_patients):
+        doctor_idx = slot_doctors[i]
+        if forbidden[shuffled[i]] == doctor_idx:
+            j = i + 1
+            while j < nof_patients and forbidden[shuffled[j]] == doctor_idx:
+                j += 1
+            if j < nof_patients:
+                shuffled[i], shuffled[j] = shuffled[j], shuffled[i]
+            else:
+                repaired = False
+                for k in range(i):
+                    if (
+                        forbidden[shuffled[k]] != doctor_idx
+                        and forbidden[shuffled[i]] != slot_doctors[k]
+                    ):
+                        shuffled[i], shuffled[k] = shuffled[k], shuffled[i]
+                        repaired = True
+                        break
+                if not repaired:
+                    # No patient swap can clear this slot (a perfectly even
+                    # second round is infeasible, e.g. 2 doctors and an odd
+                    # patient count). Give the slot to the next doctor instead
+                    # and accept counts that are uneven by one.
+                    slot_doctors[i] = (doctor_idx + 1) % nof_doctors
+
+    doc2 = [None] * nof_patients
+    for i, patient_id in enumerate(shuffled):
+        doctor = doc_list[slot_doctors[i]]
+        doctor.patients_second.append(patient_id)
+        doc2[id_to_idx[patient_id]] = doctor.name
+    for doctor in doc_list:
+        doctor.patients_second_set = set(doctor.patients_second)
+    return doc2
+
+
+def check_input(ids, doctors):
     """Return True if the input data is ok, i.e., no duplicates found etc. Any errors
     found are printed"""
     input_ok = True
-    s = set()
-    duplicates = set()
-    for patient in patients.values():
-        if patient.id not in s:
-            s.add(patient.id)
-        else:
-            duplicates.add(patient.id)
+    nof_duplicates = 0
+    positions = defaultdict(list)
+    for idx, patient_id in enumerate(ids, start=1):
+        positions[patient_id].append(idx)
 
     # Print all duplicate patients
-    for duplicate_pat_id in duplicates:
-        idx = []
-        for i, patient in enumerate(patients):
-            if patient.id == duplicate_pat_id:
-                idx.append(i + 1)  # Add to convert from 0 indexing to 1 indexing
-        print(
-            f"Patient {duplicate_pat_id} found more than once (rows: {', '.join([str(i) for i in idx])})"
-        )
+    for patient_id, row_numbers in positions.items():
+        if len(row_numbers) > 1:
+            nof_duplicates += 1
+            print(
+                f"Patient {patient_id} found more than once (rows: {', '.join(map(str, row_numbers))})"
+            )
 
     doctor_names = [doctor.name for doctor in doctors.values()]
     if len(set(doctor_names)) != len(doctors):
         input_ok = False
         print(f"Duplicate doctors found - check input file")
 
-    if len(duplicates) != 0:
+    if nof_duplicates != 0:
         input_ok = False
 
     print(f"Number of doctors: {len(doctors)}")
-    print(f"Number of patients: {len(patients)} (unique: {len(s)})")
+    print(f"Number of patients: {len(ids)} (unique: {len(positions)})")
     return input_ok
 
 
@@ -162,33 +316,37 @@ def check(condition, error_message):
         exit()
 
 
-def check_distribution(doctors, patients):
+def check_distribution(doctors, ids, doc1, doc2):
     """Run some checks on the distribution. Exit if any errors are found"""
-    first_round = []
-    second_round = []
+    all_patient_ids = set(ids)
+    first_round = set()
+    second_round = set()
+    nof_first = 0
+    nof_second = 0
     for doctor in doctors.values():
         # Make sure that no patient is handled twice
         check(
-            len(set(doctor.patients_first) - set(doctor.patients_second)) != 0,
+            doctor.patients_first_set.isdisjoint(doctor.patients_second_set),
             f"At least one patient handled twice by {doctor.name}",
         )
-        first_round.extend(doctor.patients_first)
-        second_round.extend(doctor.patients_second)
+        first_round.update(doctor.patients_first_set)
+        second_round.update(doctor.patients_second_set)
+        nof_first += len(doctor.patients_first)
+        nof_second += len(doctor.patients_second)
 
     # Make sure that all patients are handled in both rounds
-    all_patient_ids = {p.id for p in patients.values()}
     check(
-        len(first_round) == len(patients) and set(first_round) - all_patient_ids == set(),
+        nof_first == len(ids) and first_round == all_patient_ids,
         f"Not all patients handled in the first round",
     )
     check(
-        len(second_round) == len(patients) and set(second_round) - all_patient_ids == set(),
+        nof_second == len(ids) and second_round == all_patient_ids,
         f"Not all patients handled in the second round",
     )
-    for patient in patients.values():
+    for patient_id, first, second in zip(ids, doc1, doc2):
         check(
-            patient.data[patient.first_idx] != patient.data[patient.first_idx + 1],
-            f"Patient {patient.id} handled by the same doctor twice",
+            first != second,
+            f"Patient {patient_id} handled by the same doctor twice",
         )
 
 
@@ -221,19 +379,22 @@ time. Each patient is then placed on a new doctor.""",
     if args.seed:
         print(f"Seed provided ({args.seed})")
         random.seed(args.seed)
+        if np is not None:
+            np.random.seed(args.seed)
 
     doctors = read_doctor_data(args.doctors)
-    header, patients = read_patient_data(args.patients)
+    header, ids = read_patient_data(args.patients)
 
     # Stop execution if any errors are found
-    if not check_input(patients, doctors):
+    if not check_input(ids, doctors):
         exit()
 
-    distribute_first(patients, doctors)
-    distribute_second(patients, doctors)
+    id_to_idx = {patient_id: idx for idx, patient_id in enumerate(ids)}
+    doc1, forbidden = distribute_first(ids, id_to_idx, doctors)
+    doc2 = distribute_second(ids, id_to_idx, doctors, forbidden)
     print_distribution_info(doctors)
 
-    check_distribution(doctors, patients)
+    check_distribution(doctors, ids, doc1, doc2)
 
-    write_patient_data(header, patients, args.output)
+    write_patient_data(header, doc1, doc2, args.patients, args.output)
     print("Finished in {} seconds".format(time.process_time()))